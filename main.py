@@ -5,27 +5,39 @@
 Grow SQL: Herramienta profesional para formatear y analizar consultas SQL.
 """
 
+import atexit
+import functools
+import hashlib
 import os
+import pathlib
+import socket
 import sys
+import threading
 import time
-import json
+from concurrent.futures import Future
 from typing import Dict, Any, Optional, Tuple, List
 
 # Third-party imports
-import sqlparse
-import requests
+# Nota: httpx, orjson, sqlparse, diskcache y pyfiglet se importan de forma diferida
+# dentro de las funciones que los usan, para acortar el arranque en frío del CLI.
 from dotenv import load_dotenv
-from pyfiglet import Figlet
 from rich.console import Console
 from rich.prompt import Prompt
 from rich.panel import Panel
 from rich.text import Text
 from rich.status import Status
+from rich.theme import Theme
 
 # --- Constantes ---
 OPENROUTER_API_URL = "https://openrouter.ai/api/v1/chat/completions"
 DEFAULT_AI_MODEL = "deepseek/deepseek-chat-v3-0324:free"
 REQUEST_TIMEOUT = 60  # Segundos
+RETRY_TOTAL = 3  # Reintentos ante respuestas transitorias 429/5xx
+RETRY_BACKOFF = 0.5  # Segundos; la espera se duplica en cada intento
+RETRY_STATUS_CODES = (429, 502, 503, 504)
+CACHE_DIR = os.path.expanduser("~/.grow-sql-cache")
+CACHE_SIZE_LIMIT = 50 * 1024 * 1024  # 50 MB
+CACHE_TTL = 7 * 86400  # Una semana, en segundos
 
 # Mensajes de Sistema para IA
 SYSTEM_PROMPT_RECOMMENDATIONS = (
@@ -39,169 +51,496 @@ SYSTEM_PROMPT_EXPLANATION = (
     "cómo funciona la consulta SQL proporcionada, paso a paso, de forma clara y "
     "concisa en español. Formatea la respuesta para que sea compatible en una terminal, ya que el resultado o el mensaje respuesta se muestra en la terminal"
 )
+SYSTEM_PROMPT_COMBINED = (
+    "Eres un experto analista de SQL. Para la consulta proporcionada entrega, "
+    "en español y en una sola respuesta, dos secciones delimitadas por los "
+    "encabezados markdown '## Recomendaciones' y '## Explicación': primero "
+    "recomendaciones concisas de optimización y buenas prácticas, después una "
+    "explicación paso a paso de cómo funciona la consulta. "
+    "Formatea la respuesta para que sea compatible en una terminal, ya que el resultado o el mensaje respuesta se muestra en la terminal"
+)
 
 # Mensajes de Usuario
 MSG_ASK_SQL_QUERY = "\n[bold yellow]Ingresa tu consulta SQL:[/bold yellow]"
 MSG_ASK_CONTINUE = "\n¿Deseas realizar otra operación?"
-MSG_THANKS = "\n[bold blue]¡Gracias por usar Grow SQL![/bold blue]"
+MSG_THANKS = "\n[info]¡Gracias por usar Grow SQL![/info]"
 MSG_API_KEY_ERROR = (
-    "[bold red]Error:[/bold red] La funcionalidad de IA no está disponible. "
+    "[err]Error:[/err] La funcionalidad de IA no está disponible. "
     "Configura tu token de OpenRouter (OPENROUTER_API_KEY) en el archivo .env"
 )
 MSG_API_WAIT_NOTE = (
-    "[yellow]Nota:[/yellow] La API puede tardar hasta "
+    "[warn]Nota:[/warn] La API puede tardar hasta "
     f"{REQUEST_TIMEOUT} segundos o más en responder..."
 )
 
+# Estilo del panel de resultado por tipo de análisis: (título, borde)
+PANEL_STYLES = {
+    "recommendations": ("Análisis IA", "magenta"),
+    "explanation": ("Explicación IA", "cyan"),
+    "combined": ("Análisis IA combinado", "magenta"),
+}
+
+# Etiqueta corta y encabezado mostrado para cada tipo de análisis
+AI_LABELS = {
+    "recommendations": ("recomendaciones", "[title]Recomendaciones de IA:[/title]"),
+    "explanation": ("explicación", "[bold cyan]Explicación de la Consulta:[/bold cyan]"),
+    "combined": ("recomendaciones y explicación", "[title]Análisis combinado de IA:[/title]"),
+}
+
 # --- Configuración ---
 load_dotenv()
 
 OPENROUTER_API_KEY = os.getenv('OPENROUTER_API_KEY')
 AI_MODEL = os.getenv('AI_MODEL', DEFAULT_AI_MODEL)
+# Streaming SSE activado por defecto; exporta AI_STREAMING=0 para desactivarlo
+AI_STREAMING = os.getenv('AI_STREAMING', '1') != '0'
+# Estrategia alternativa para la opción combinada: exporta AI_PARALLEL=1 para
+# lanzar recomendaciones y explicación como dos llamadas concurrentes
+# (terminan en max(t1, t2)) en lugar de un solo prompt combinado
+AI_PARALLEL = os.getenv('AI_PARALLEL', '0') != '0'
 SITE_URL = os.getenv('SITE_URL', "https://github.com/Nair-Villagran/grow-sql") # Ejemplo
 SITE_NAME = os.getenv('SITE_NAME', "Grow SQL") # Ejemplo
 
 # --- Inicialización ---
-console = Console()
+# El Theme registra los estilos una sola vez; usar nombres cortos ([ok], [err],
+# etc.) evita re-parsear el markup completo en cada print del bucle interactivo.
+console = Console(theme=Theme({
+    "ok": "bold green",
+    "err": "bold red",
+    "warn": "yellow",
+    "info": "bold blue",
+    "title": "bold magenta",
+}))
+
+# Señal de cancelación (Ctrl+C): los hilos de llamadas IA abandonadas la
+# consultan para dejar de renderizar/imprimir y abortar cuanto antes.
+_CANCEL_EVENT = threading.Event()
+
+@functools.lru_cache(maxsize=1)
+def _get_cache():
+    """Abre (una sola vez) la caché persistente de análisis IA: una consulta
+    repetida se resuelve con una lectura de disco en lugar de otra llamada a
+    la API de hasta 60s."""
+    import diskcache
+
+    cache = diskcache.Cache(CACHE_DIR, size_limit=CACHE_SIZE_LIMIT)
+    atexit.register(cache.close)
+    return cache
+
+@functools.lru_cache(maxsize=1)
+def _get_client():
+    """Construye (una sola vez) el cliente HTTP compartido.
+
+    El cliente habla HTTP/2 (multiplexación sobre una sola conexión TLS) y
+    mantiene conexiones keep-alive entre llamadas a la API, evitando el coste
+    del handshake en cada solicitud. Se desactiva además el algoritmo de
+    Nagle (TCP_NODELAY) para que el cuerpo de la solicitud se envíe de
+    inmediato. Importar httpx cuesta decenas de ms, así que se difiere hasta
+    la primera llamada a la IA.
+    """
+    import httpx
+
+    transport = httpx.HTTPTransport(
+        http2=True,
+        retries=2,  # Reintenta errores de conexión (no de estado HTTP)
+        limits=httpx.Limits(
+            max_keepalive_connections=4,
+            max_connections=8,
+            keepalive_expiry=30.0,
+        ),
+        socket_options=[
+            (socket.IPPROTO_TCP, socket.TCP_NODELAY, 1),
+            (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1),
+        ],
+    )
+    client = httpx.Client(
+        transport=transport,
+        timeout=REQUEST_TIMEOUT,
+        headers={
+            "Authorization": f"Bearer {OPENROUTER_API_KEY}",
+            "Content-Type": "application/json",
+            "Accept-Encoding": "gzip, deflate",  # Negociar compresión de la respuesta
+            "HTTP-Referer": SITE_URL,  # Opcional, recomendado por OpenRouter
+            "X-Title": SITE_NAME,      # Opcional, recomendado por OpenRouter
+        },
+    )
+    atexit.register(client.close)
+    return client
+
+def _close_client() -> None:
+    """Cierra el cliente HTTP compartido, abortando las conexiones en vuelo,
+    y descarta el singleton para que la próxima llamada construya uno nuevo.
+
+    Sin esto, un hilo abandonado tras Ctrl+C seguiría bloqueado en su POST
+    hasta REQUEST_TIMEOUT, y al salir el intérprete esperaría ese mismo
+    tiempo para poder unir el hilo.
+    """
+    if _get_client.cache_info().currsize == 0:
+        return # Nunca se construyó; nada que cerrar
+    try:
+        _get_client().close()
+    except Exception:
+        pass # Cerrar es best-effort; el hilo abandonado fallará igualmente
+    _get_client.cache_clear()
 
 # --- Funciones Auxiliares ---
 
-def print_header() -> None:
-    """Imprime la cabecera de la aplicación con ASCII art."""
+def _render_header_art() -> str:
+    """Obtiene el arte ASCII de la cabecera, cacheado en disco.
+
+    pyfiglet parsea un archivo de fuente de cientos de KB en cada arranque;
+    cachear el render por (nombre, fuente, ancho) lo reduce a una lectura
+    de archivo en los arranques siguientes.
+    """
+    cache_file = pathlib.Path(CACHE_DIR, f"header-{SITE_NAME}-big-{console.width}.txt")
+    try:
+        return cache_file.read_text()
+    except OSError:
+        pass # Sin caché todavía; renderizar
+
     try:
-        custom_fig = Figlet(font='big', width=console.width)
-        ascii_art = custom_fig.renderText(SITE_NAME)
+        from pyfiglet import Figlet
+        ascii_art = Figlet(font='big', width=console.width).renderText(SITE_NAME)
     except Exception: # Fallback si pyfiglet falla
+        return SITE_NAME
+
+    try:
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        cache_file.write_text(ascii_art)
+    except OSError:
+        pass # Cachear es opcional; no bloquear el arranque
+    return ascii_art
+
+def print_header() -> None:
+    """Imprime la cabecera de la aplicación con ASCII art."""
+    if console.width < 60:
+        # Terminal estrecha: el arte ASCII no cabe, usar el nombre plano
         ascii_art = SITE_NAME
+    else:
+        ascii_art = _render_header_art()
 
     console.print(Panel.fit(
         f"[bold cyan]{ascii_art}[/]\n"
         f"[italic yellow]Herramienta profesional para formatear y analizar consultas SQL[/]",
         border_style="bright_blue",
         padding=(1, 2),
-        title="[bold magenta]v1.1[/]", # Versión actualizada
+        title="[title]v1.1[/]", # Versión actualizada
         subtitle=f"[green]by @Nair-Villagran ({SITE_URL})[/green]"
     ))
 
+@functools.lru_cache(maxsize=256)
+def _format_sql_cached(query: str) -> str:
+    """Formatea y memoriza el resultado: repetir la misma consulta evita
+    volver a tokenizar con sqlparse."""
+    import sqlparse
+    return sqlparse.format(query, reindent=True, keyword_case='upper')
+
 def format_sql(query: str) -> str:
     """Formatea la consulta SQL usando sqlparse."""
     try:
-        formatted = sqlparse.format(query, reindent=True, keyword_case='upper')
-        return formatted
+        return _format_sql_cached(query)
     except Exception as e:
-        console.print(f"[bold red]Error al formatear SQL:[/bold red] {e}")
+        console.print(f"[err]Error al formatear SQL:[/err] {e}")
         return query # Devuelve la consulta original en caso de error
 
-def _call_openrouter_api(messages: List[Dict[str, str]], status: Status) -> Tuple[Optional[Dict[str, Any]], Optional[str], float]:
+def _prewarm_connection() -> None:
+    """Precalienta en segundo plano la conexión TLS hacia OpenRouter.
+
+    El primer análisis paga el handshake TCP+TLS completo (~150-300ms); al
+    lanzarlo durante el arranque, la conexión ya está en el pool cuando el
+    usuario envía su primera consulta.
+    """
+    def _warm() -> None:
+        try:
+            _get_client().head("https://openrouter.ai/", timeout=5)
+        except Exception:
+            pass # El precalentamiento es oportunista; los fallos no importan
+
+    threading.Thread(target=_warm, daemon=True).start()
+
+def _retry_delay(response: Any, attempt: int) -> float:
+    """Calcula la espera antes del siguiente reintento: respeta el encabezado
+    Retry-After si el servidor lo envía; si no, backoff exponencial."""
+    retry_after = response.headers.get("Retry-After")
+    if retry_after:
+        try:
+            return float(retry_after)
+        except ValueError:
+            pass # Retry-After con formato de fecha HTTP; usar backoff
+    return RETRY_BACKOFF * (2 ** attempt)
+
+def _post_with_retry(data: Dict[str, Any]) -> Any:
+    """Envía el POST a OpenRouter reintentando ante 429/5xx transitorios.
+
+    El tier gratuito devuelve 429 bajo carga; reintentar aquí evita que el
+    usuario tenga que reescribir la consulta, y cada intento reutiliza la
+    conexión del pool sin un nuevo handshake.
+    """
+    response = None
+    for attempt in range(RETRY_TOTAL + 1):
+        response = _get_client().post(OPENROUTER_API_URL, json=data, timeout=REQUEST_TIMEOUT)
+        if response.status_code not in RETRY_STATUS_CODES or attempt == RETRY_TOTAL:
+            break
+        if _CANCEL_EVENT.is_set():
+            break # Operación cancelada: no dormir ni reintentar
+        time.sleep(_retry_delay(response, attempt))
+    return response
+
+def _normalize_for_llm(query: str) -> str:
+    """Normaliza la consulta antes de enviarla al modelo: elimina comentarios
+    y espacios redundantes. Menos tokens de entrada significa menor TTFT y
+    coste, y la forma canónica mejora la tasa de aciertos de la caché."""
+    import sqlparse
+    return sqlparse.format(query, strip_comments=True, reindent=False, strip_whitespace=True).strip()
+
+def _cache_key(query: str, analysis_type: str) -> str:
+    """Calcula la clave de caché para un análisis: SHA-256 del modelo,
+    el tipo de análisis y la consulta normalizada (sin comentarios)."""
+    raw = f"{AI_MODEL}|{analysis_type}|{_normalize_for_llm(query)}"
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+def _call_openrouter_api(messages: List[Dict[str, str]], status: Optional[Status]) -> Tuple[Optional[Dict[str, Any]], Optional[str], float]:
     """
     Realiza la llamada a la API de OpenRouter.
 
+    Args:
+        messages: Mensajes system/user para el modelo.
+        status: Spinner a actualizar, o None si no hay uno activo (por
+            ejemplo, al llamar desde un hilo en paralelo).
+
     Retorna:
         Tuple[Optional[Dict[str, Any]], Optional[str], float]:
             (datos_respuesta, mensaje_error, duracion)
     """
-    start_time = time.time()
+    import httpx
+    import orjson
+
+    start_time = time.perf_counter()
     if not OPENROUTER_API_KEY:
         return None, MSG_API_KEY_ERROR, 0.0
 
-    headers = {
-        "Authorization": f"Bearer {OPENROUTER_API_KEY}",
-        "Content-Type": "application/json",
-        "HTTP-Referer": SITE_URL, # Opcional, recomendado por OpenRouter
-        "X-Title": SITE_NAME,     # Opcional, recomendado por OpenRouter
-    }
     data = {
         "model": AI_MODEL,
         "messages": messages,
         # "temperature": 0.7, # Puedes añadir más parámetros si lo deseas
     }
 
+    result_data: Optional[Dict[str, Any]] = None
+    error_msg: Optional[str] = None
+
     try:
-        status.update(f"[bold green]Enviando solicitud a {AI_MODEL}...[/bold green]")
-        response = requests.post(
-            OPENROUTER_API_URL,
-            headers=headers,
-            json=data,
-            timeout=REQUEST_TIMEOUT
-        )
-        duration = time.time() - start_time
-        response.raise_for_status() # Lanza HTTPError para respuestas 4xx/5xx
-        return response.json(), None, duration
-
-    except requests.exceptions.Timeout:
-        duration = time.time() - start_time
-        return None, f"La solicitud excedió el tiempo máximo de espera ({REQUEST_TIMEOUT}s).", duration
-    except requests.exceptions.RequestException as e:
-        duration = time.time() - start_time
-        error_detail = f"Error de red/API: {e}"
-        if e.response is not None:
-            try:
-                error_detail += f" - {e.response.text}"
-            except Exception:
-                pass # Ignorar si no se puede leer el cuerpo de la respuesta
-        return None, error_detail, duration
-    except json.JSONDecodeError:
-        duration = time.time() - start_time
-        return None, "Error al decodificar la respuesta JSON de la API.", duration
+        if status is not None:
+            status.update(f"[ok]Enviando solicitud a {AI_MODEL}...[/ok]")
+        response = _post_with_retry(data)
+        response.raise_for_status() # Lanza HTTPStatusError para respuestas 4xx/5xx
+        # Detener el spinner antes del decode: la animación repinta la
+        # terminal ~12 veces/s y competiría con el parseo CPU-bound.
+        if status is not None:
+            status.stop()
+        result_data = orjson.loads(response.content)
+    except httpx.TimeoutException:
+        error_msg = f"La solicitud excedió el tiempo máximo de espera ({REQUEST_TIMEOUT}s)."
+    except httpx.HTTPStatusError as e:
+        error_msg = f"Error de red/API: {e}"
+        try:
+            error_msg += f" - {e.response.text}"
+        except Exception:
+            pass # Ignorar si no se puede leer el cuerpo de la respuesta
+    except httpx.HTTPError as e:
+        error_msg = f"Error de red/API: {e}"
+    except orjson.JSONDecodeError:
+        error_msg = "Error al decodificar la respuesta JSON de la API."
+    except Exception as e:
+        error_msg = f"Error inesperado durante la llamada API: {e}"
+    finally:
+        # Una sola lectura del reloj cubre todos los desenlaces
+        duration = time.perf_counter() - start_time
+
+    return result_data, error_msg, duration
+
+def _call_openrouter_api_stream(messages: List[Dict[str, str]], title: str, border_style: str) -> Tuple[Optional[str], Optional[str], float]:
+    """
+    Realiza la llamada a la API de OpenRouter en modo streaming (SSE).
+
+    Renderiza los tokens de forma progresiva en un panel Live a medida que
+    llegan, de modo que la latencia percibida baja de la generación completa
+    al tiempo hasta el primer token.
+
+    Retorna:
+        Tuple[Optional[str], Optional[str], float]:
+            (contenido_completo, mensaje_error, duracion)
+    """
+    import httpx
+    import orjson
+    from rich.live import Live
+
+    start_time = time.perf_counter()
+    if not OPENROUTER_API_KEY:
+        return None, MSG_API_KEY_ERROR, 0.0
+
+    data = {
+        "model": AI_MODEL,
+        "messages": messages,
+        "stream": True,
+    }
+    chunks: List[str] = []
+    error_msg: Optional[str] = None
+
+    try:
+        for attempt in range(RETRY_TOTAL + 1):
+            with _get_client().stream("POST", OPENROUTER_API_URL, json=data, timeout=REQUEST_TIMEOUT) as response:
+                # Reintentar 429/5xx transitorios antes de empezar a renderizar
+                if response.status_code in RETRY_STATUS_CODES and attempt < RETRY_TOTAL and not _CANCEL_EVENT.is_set():
+                    time.sleep(_retry_delay(response, attempt))
+                    continue
+                response.raise_for_status()
+                with Live(console=console, refresh_per_second=8) as live:
+                    for line in response.iter_lines():
+                        if _CANCEL_EVENT.is_set():
+                            # El usuario canceló desde el hilo principal:
+                            # detener el panel y abortar la respuesta en curso
+                            error_msg = "Cancelado por usuario"
+                            live.stop()
+                            response.close()
+                            break
+                        if not line.startswith("data: "):
+                            continue
+                        payload = line[len("data: "):].strip()
+                        if payload == "[DONE]":
+                            break
+                        try:
+                            delta = orjson.loads(payload)['choices'][0].get('delta', {}).get('content')
+                        except (orjson.JSONDecodeError, KeyError, IndexError, TypeError):
+                            continue # Ignorar chunks keep-alive o malformados
+                        if delta:
+                            chunks.append(delta)
+                            live.update(Panel("".join(chunks), border_style=border_style, title=title, expand=False))
+            break
+        if not chunks and error_msg is None:
+            error_msg = "La API no devolvió contenido en el stream."
+    except httpx.TimeoutException:
+        error_msg = f"La solicitud excedió el tiempo máximo de espera ({REQUEST_TIMEOUT}s)."
+    except httpx.HTTPStatusError as e:
+        error_msg = f"Error de red/API: {e}"
+        try:
+            e.response.read()
+            error_msg += f" - {e.response.text}"
+        except Exception:
+            pass # Ignorar si no se puede leer el cuerpo de la respuesta
+    except httpx.HTTPError as e:
+        error_msg = f"Error de red/API: {e}"
     except Exception as e:
-        duration = time.time() - start_time
-        return None, f"Error inesperado durante la llamada API: {e}", duration
+        error_msg = f"Error inesperado durante la llamada API: {e}"
+    finally:
+        # Una sola lectura del reloj cubre todos los desenlaces
+        duration = time.perf_counter() - start_time
+
+    if error_msg:
+        return None, error_msg, duration
+    return "".join(chunks), None, duration
 
-def get_ai_analysis(query: str, analysis_type: str = "recommendations") -> Dict[str, Any]:
+def get_ai_analysis(query: str, analysis_type: str = "recommendations", stream: Optional[bool] = None, quiet: bool = False) -> Dict[str, Any]:
     """
     Obtiene análisis de IA (recomendaciones o explicación) para la consulta SQL.
 
     Args:
         query (str): La consulta SQL a analizar.
-        analysis_type (str): 'recommendations' o 'explanation'.
+        analysis_type (str): 'recommendations', 'explanation' o 'combined'.
+        stream (Optional[bool]): Fuerza (o desactiva) el modo streaming;
+            None usa el valor global AI_STREAMING.
+        quiet (bool): No abrir un spinner Status propio. Obligatorio al
+            llamar desde hilos en paralelo: solo puede haber una pantalla
+            Live activa a la vez.
 
     Returns:
         Dict[str, Any]: {
             'success': bool,
             'content': Optional[str],
             'error': Optional[str],
-            'duration': float
+            'duration': float,
+            'streamed': bool (opcional; True si ya se mostró en vivo)
         }
     """
+    # Normalizar una sola vez: el prompt y la clave de caché usan la misma forma
+    query = _normalize_for_llm(query)
+
     if analysis_type == "recommendations":
         system_prompt = SYSTEM_PROMPT_RECOMMENDATIONS
         user_prompt = f"Por favor analiza la siguiente consulta SQL y proporciona recomendaciones concisas para mejorarla:\n\n```sql\n{query}\n```"
     elif analysis_type == "explanation":
         system_prompt = SYSTEM_PROMPT_EXPLANATION
         user_prompt = f"Explica en detalle cómo funciona esta consulta SQL:\n\n```sql\n{query}\n```"
+    elif analysis_type == "combined":
+        # Una sola ida y vuelta a la API produce ambas secciones, ahorrando
+        # un handshake y un prompt completo frente a dos llamadas separadas.
+        system_prompt = SYSTEM_PROMPT_COMBINED
+        user_prompt = (
+            "Analiza la siguiente consulta SQL y responde con las secciones "
+            "'## Recomendaciones' y '## Explicación':\n\n"
+            f"```sql\n{query}\n```"
+        )
     else:
         return {"success": False, "content": None, "error": "Tipo de análisis no válido", "duration": 0.0}
 
+    if stream is None:
+        stream = AI_STREAMING
+
+    cache = _get_cache()
+    cache_key = _cache_key(query, analysis_type)
+    cached_content = cache.get(cache_key)
+    if cached_content is not None:
+        console.print("\n[dim]Análisis recuperado de la caché local.[/dim]")
+        return {"success": True, "content": cached_content, "error": None, "duration": 0.0}
+
     messages = [
         {"role": "system", "content": system_prompt},
         {"role": "user", "content": user_prompt}
     ]
 
-    console.print(f"\n[yellow][{time.strftime('%H:%M:%S')}] Iniciando solicitud a la IA ({analysis_type})...[/yellow]")
+    console.print(f"\n[warn][{time.strftime('%H:%M:%S')}] Iniciando solicitud a la IA ({analysis_type})...[/warn]")
     console.print(MSG_API_WAIT_NOTE)
 
     result_data: Optional[Dict[str, Any]] = None
+    streamed_content: Optional[str] = None
     error_msg: Optional[str] = None
     duration: float = 0.0
 
     try:
-        with console.status("[bold green]Procesando solicitud a la IA...[/bold green]", spinner="dots") as status:
-            result_data, error_msg, duration = _call_openrouter_api(messages, status)
+        if stream and not quiet:
+            title, border_style = PANEL_STYLES.get(analysis_type, ("Análisis IA", "magenta"))
+            streamed_content, error_msg, duration = _call_openrouter_api_stream(messages, title, border_style)
+        elif quiet:
+            result_data, error_msg, duration = _call_openrouter_api(messages, None)
+        else:
+            with console.status("[ok]Procesando solicitud a la IA...[/ok]", spinner="dots") as status:
+                result_data, error_msg, duration = _call_openrouter_api(messages, status)
     except KeyboardInterrupt:
-        console.print("\n[bold red]Operación cancelada por el usuario.[/bold red]")
-        return {"success": False, "content": None, "error": "Cancelado por usuario", "duration": time.time() - start_time if 'start_time' in locals() else 0.0} # Asegura que start_time exista
+        console.print("\n[err]Operación cancelada por el usuario.[/err]")
+        return {"success": False, "content": None, "error": "Cancelado por usuario", "duration": time.perf_counter() - start_time if 'start_time' in locals() else 0.0} # Asegura que start_time exista
 
-    console.print(f"[yellow][{time.strftime('%H:%M:%S')}] Solicitud completada en {duration:.2f}s[/yellow]")
+    if _CANCEL_EVENT.is_set():
+        # Operación cancelada mientras esta llamada seguía en vuelo: no
+        # imprimir nada sobre el menú ya retomado
+        return {"success": False, "content": None, "error": "Cancelado por usuario", "duration": duration}
+
+    console.print(f"[warn][{time.strftime('%H:%M:%S')}] Solicitud completada en {duration:.2f}s[/warn]")
 
     if error_msg:
         return {"success": False, "content": None, "error": error_msg, "duration": duration}
 
+    if streamed_content is not None:
+        content = streamed_content.strip()
+        cache.set(cache_key, content, expire=CACHE_TTL)
+        # El contenido ya se mostró en el panel Live; el llamador no debe repetirlo
+        return {"success": True, "content": content, "error": None, "duration": duration, "streamed": True}
+
     if result_data and 'choices' in result_data and len(result_data['choices']) > 0:
         # Asegurarse de que la estructura esperada exista
         try:
-            content = result_data['choices'][0]['message']['content']
+            content = result_data['choices'][0]['message']['content'].strip()
             # Aquí podrías añadir validación del contenido si es necesario
-            return {"success": True, "content": content.strip(), "error": None, "duration": duration}
+            cache.set(cache_key, content, expire=CACHE_TTL)
+            return {"success": True, "content": content, "error": None, "duration": duration}
         except (KeyError, IndexError, TypeError) as e:
             error_detail = f"Estructura de respuesta inesperada de la API: {e} - Datos: {result_data}"
             return {"success": False, "content": None, "error": error_detail, "duration": duration}
@@ -226,106 +565,172 @@ def _ask_to_continue() -> bool:
 
 # --- Manejadores de Opciones del Menú ---
 
-def _handle_format_only() -> None:
-    """Maneja la opción de solo formatear."""
-    try:
-        query = Prompt.ask(MSG_ASK_SQL_QUERY)
-        if not query.strip():
-            console.print("[yellow]Advertencia:[/yellow] Consulta vacía.")
-            return
-        formatted_query = format_sql(query)
-        console.print("\n[bold green]Consulta formateada:[/bold green]")
-        # Usar Panel para mejor visualización de bloques de código
-        console.print(Panel(formatted_query, border_style="dim", expand=False))
-    except KeyboardInterrupt:
-        console.print("\n[bold red]Operación cancelada.[/bold red]")
-    except Exception as e:
-        console.print(f"[bold red]Error inesperado:[/bold red] {e}")
+# Palabras clave que delatan una consulta SQL plausible
+_SQL_KEYWORDS = ("select", "insert", "update", "delete", "create", "alter",
+                 "drop", "truncate", "with", "explain")
 
+def _looks_like_sql(query: str) -> bool:
+    """Heurística mínima para no gastar una llamada a la API (hasta 60s y
+    tokens facturables) en texto que claramente no es SQL."""
+    lowered = query.lower()
+    return ";" in lowered or any(keyword in lowered for keyword in _SQL_KEYWORDS)
 
-def _handle_format_and_recommend() -> None:
-    """Maneja la opción de formatear y obtener recomendaciones."""
-    if not _check_api_key():
+def _submit_ai_call(*args: Any, **kwargs: Any) -> Future:
+    """Lanza get_ai_analysis en un hilo daemon y devuelve su Future.
+
+    Se usa un hilo daemon en lugar de ThreadPoolExecutor porque el intérprete
+    une los hilos de un executor al terminar: una llamada abandonada tras
+    Ctrl+C bloquearía la salida del programa hasta REQUEST_TIMEOUT.
+    """
+    future: Future = Future()
+
+    def _work() -> None:
+        try:
+            future.set_result(get_ai_analysis(*args, **kwargs))
+        except BaseException as e:
+            future.set_exception(e)
+
+    threading.Thread(target=_work, daemon=True).start()
+    return future
+
+def _merge_parallel_results(rec: Dict[str, Any], expl: Dict[str, Any]) -> Dict[str, Any]:
+    """Combina los resultados de las dos llamadas concurrentes en el mismo
+    formato seccionado que produce el análisis 'combined'."""
+    duration = max(rec["duration"], expl["duration"])
+    if not (rec["success"] and expl["success"]):
+        error = rec["error"] or expl["error"]
+        return {"success": False, "content": None, "error": error, "duration": duration}
+
+    content = (
+        f"## Recomendaciones\n{rec['content']}\n\n"
+        f"## Explicación\n{expl['content']}"
+    )
+    return {"success": True, "content": content, "error": None, "duration": duration}
+
+def _render_combined(content: str) -> None:
+    """Separa la respuesta combinada en sus dos secciones y las muestra en
+    paneles independientes; si el modelo no respetó los encabezados, muestra
+    el contenido completo en un solo panel."""
+    recommendations, _, explanation = content.partition("## Explicación")
+    recommendations = recommendations.replace("## Recomendaciones", "").strip()
+    explanation = explanation.strip()
+
+    if not recommendations and not explanation:
+        console.print(Panel(content, border_style="magenta", title="Análisis IA", expand=False))
         return
-    try:
-        query = Prompt.ask(MSG_ASK_SQL_QUERY)
-        if not query.strip():
-            console.print("[yellow]Advertencia:[/yellow] Consulta vacía.")
-            return
+    if recommendations:
+        console.print(Panel(recommendations, border_style="magenta", title="Análisis IA", expand=False))
+    if explanation:
+        console.print(Panel(explanation, border_style="cyan", title="Explicación IA", expand=False))
 
-        formatted_query = format_sql(query)
-        console.print("\n[bold green]Consulta formateada:[/bold green]")
-        console.print(Panel(formatted_query, border_style="dim", expand=False))
+def _run(do_format: bool, ai_type: Optional[str]) -> None:
+    """Maneja una opción del menú de forma parametrizada.
 
-        console.print("\n[bold blue]Obteniendo recomendaciones de IA...[/bold blue]")
-        result = get_ai_analysis(query, "recommendations")
+    Args:
+        do_format (bool): Si se debe formatear y mostrar la consulta.
+        ai_type (Optional[str]): Tipo de análisis IA a solicitar
+            ('recommendations' o 'explanation'), o None para omitirlo.
+    """
+    if ai_type and not _check_api_key():
+        return
+    try:
+        # Normalizar la entrada una sola vez; todo lo demás usa la forma limpia
+        query = Prompt.ask(MSG_ASK_SQL_QUERY).strip()
+        if not query:
+            console.print("[warn]Advertencia:[/warn] Consulta vacía.")
+            return
+        if ai_type and (len(query) < 6 or not _looks_like_sql(query)):
+            console.print("[warn]Advertencia:[/warn] Consulta demasiado corta o que no parece SQL; no se envía a la IA.")
+            return
 
-        if result["success"] and result["content"]:
-            console.print("\n[bold magenta]Recomendaciones de IA:[/bold magenta]")
-            console.print(Panel(result["content"], border_style="magenta", title="Análisis IA", expand=False))
-            minutes = int(result['duration'] // 60)
-            seconds = result['duration'] % 60
-            console.print(f"\n[dim]Tiempo de análisis IA: {minutes}m {seconds:.2f}s[/dim]")
+        # Lanza las llamadas a la IA en segundo plano para que el usuario vea
+        # la consulta formateada de inmediato mientras la red sigue trabajando.
+        parallel = ai_type == "combined" and AI_PARALLEL
+        if ai_type:
+            _CANCEL_EVENT.clear() # Nueva operación: olvidar cancelaciones previas
+        if parallel:
+            # Dos llamadas concurrentes multiplexadas sobre la misma
+            # conexión HTTP/2: terminan en max(t1, t2) en lugar de t1+t2.
+            # quiet=True desactiva el streaming y el spinner Status de
+            # cada llamada: solo puede haber una pantalla Live a la vez.
+            futures = [
+                _submit_ai_call(query, "recommendations", stream=False, quiet=True),
+                _submit_ai_call(query, "explanation", stream=False, quiet=True),
+            ]
+        elif ai_type:
+            futures = [_submit_ai_call(query, ai_type)]
         else:
-            console.print(f"[bold red]Error al obtener recomendaciones:[/bold red] {result['error']}")
+            futures = []
 
-    except KeyboardInterrupt:
-        console.print("\n[bold red]Operación cancelada.[/bold red]")
-    except Exception as e:
-        console.print(f"[bold red]Error inesperado:[/bold red] {e}")
+        if do_format:
+            formatted_query = format_sql(query)
+            console.print("\n[ok]Consulta formateada:[/ok]")
+            # Usar Panel para mejor visualización de bloques de código
+            console.print(Panel(formatted_query, border_style="dim", expand=False))
 
+        if not futures:
+            return
 
-def _handle_explain() -> None:
-    """Maneja la opción de explicar la consulta."""
-    if not _check_api_key():
-        return
-    try:
-        query = Prompt.ask(MSG_ASK_SQL_QUERY)
-        if not query.strip():
-            console.print("[yellow]Advertencia:[/yellow] Consulta vacía.")
+        label, heading = AI_LABELS[ai_type]
+        console.print(f"\n[info]Obteniendo {label} de IA...[/info]")
+        try:
+            results = [future.result() for future in futures]
+        except KeyboardInterrupt:
+            # Responder al Ctrl+C de inmediato: señalizar la cancelación
+            # para que el hilo abandonado deje de renderizar e imprimir,
+            # y abortar su conexión en vuelo en lugar de esperarla.
+            _CANCEL_EVENT.set()
+            _close_client()
+            console.print("\n[err]Operación cancelada.[/err]")
             return
 
-        console.print("\n[bold blue]Obteniendo explicación de la IA...[/bold blue]")
-        result = get_ai_analysis(query, "explanation")
+        result = _merge_parallel_results(*results) if parallel else results[0]
 
         if result["success"] and result["content"]:
-            console.print("\n[bold cyan]Explicación de la Consulta:[/bold cyan]")
-            console.print(Panel(result["content"], border_style="cyan", title="Explicación IA", expand=False))
+            if not result.get("streamed"):
+                console.print(f"\n{heading}")
+                if ai_type == "combined":
+                    _render_combined(result["content"])
+                else:
+                    title, border_style = PANEL_STYLES[ai_type]
+                    console.print(Panel(result["content"], border_style=border_style, title=title, expand=False))
             minutes = int(result['duration'] // 60)
             seconds = result['duration'] % 60
             console.print(f"\n[dim]Tiempo de análisis IA: {minutes}m {seconds:.2f}s[/dim]")
         else:
-            console.print(f"[bold red]Error al obtener explicación:[/bold red] {result['error']}")
+            console.print(f"[err]Error al obtener {label}:[/err] {result['error']}")
 
     except KeyboardInterrupt:
-        console.print("\n[bold red]Operación cancelada.[/bold red]")
+        console.print("\n[err]Operación cancelada.[/err]")
     except Exception as e:
-        console.print(f"[bold red]Error inesperado:[/bold red] {e}")
+        console.print(f"[err]Error inesperado:[/err] {e}")
 
 # --- Menú Principal ---
 
 def main_menu() -> None:
     """Muestra el menú principal y maneja la entrada del usuario."""
     actions = {
-        "1": _handle_format_only,
-        "2": _handle_format_and_recommend,
-        "3": _handle_explain,
+        "1": lambda: _run(do_format=True, ai_type=None),
+        "2": lambda: _run(do_format=True, ai_type="recommendations"),
+        "3": lambda: _run(do_format=False, ai_type="explanation"),
+        "4": lambda: _run(do_format=True, ai_type="combined"),
     }
 
     while True:
         console.print("\n" + "="*30)
-        console.print("[bold blue]  Menú Principal[/bold blue]")
+        console.print("[info]  Menú Principal[/info]")
         console.print("="*30)
         console.print("1. Formatear consulta SQL")
         console.print("2. Formatear y obtener recomendaciones de IA")
         console.print("3. Explicar consulta SQL con IA")
-        console.print("4. Salir")
+        console.print("4. Formatear + recomendaciones + explicación")
+        console.print("5. Salir")
         console.print("="*30)
 
         try:
-            choice = Prompt.ask("\nSelecciona una opción", choices=["1", "2", "3", "4"], default="4")
+            choice = Prompt.ask("\nSelecciona una opción", choices=["1", "2", "3", "4", "5"], default="5")
 
-            if choice == "4":
+            if choice == "5":
                 break # Salir del bucle while
 
             action = actions.get(choice)
@@ -341,7 +746,7 @@ def main_menu() -> None:
         except KeyboardInterrupt:
             break # Salir si presiona Ctrl+C en el prompt del menú
         except Exception as e:
-            console.print(f"[bold red]Error en el menú principal:[/bold red] {e}")
+            console.print(f"[err]Error en el menú principal:[/err] {e}")
             # Opcional: decidir si continuar o salir en caso de error inesperado
             if not Prompt.ask("Ocurrió un error. ¿Intentar de nuevo?", choices=["s", "n"], default="s"):
                  break
@@ -356,12 +761,14 @@ def main() -> None:
     try:
         console.clear()
         print_header()
+        if OPENROUTER_API_KEY:
+            _prewarm_connection()
         main_menu()
     except KeyboardInterrupt:
         # Asegurarse de que el mensaje de gracias se imprima incluso si se interrumpe globalmente
         console.print(MSG_THANKS)
     except Exception as e:
-        console.print(f"\n[bold red]Error fatal en la aplicación:[/bold red] {e}")
+        console.print(f"\n[err]Error fatal en la aplicación:[/err] {e}")
         # Podrías añadir logging aquí
         sys.exit(1) # Salir con código de error
 